@@ -64,6 +64,15 @@ def lower_pi(q, epsilon, X, P0, alpha, r, c):
     n = len(X)
     return r * ((1 - epsilon) * np.minimum(X, q).dot(P0) + epsilon * ((1 - alpha) * np.minimum(X[n-1], q) + alpha * np.minimum(X[0], q))) - c * q
 
+# Compute the optimizer (by convention, in case of non-uniqueness select the minimum of optimizers)
+def find_max(epsilon, X, P0, alpha, r, c):
+    qs = np.append(np.append([X[0] + 100], X), [0])
+    values = np.array([lower_pi(q, epsilon, X, P0, alpha, r, c) for q in qs])
+    max_Choq = values.max()
+    # Selects the minimum of optimizers (which has maximum index since values of X are decreasing)
+    i_max = np.max(np.argwhere(np.abs(values - max_Choq) <= 0.000001))
+    return (qs[i_max], max_Choq)
+
 
 ###############################################################################
 # MINIMAX PROBLEM
@@ -183,8 +192,8 @@ def upper_lambda(q, epsilon, i_s, j_s, X, P0, m_ss, a, b):
 
 # Compute the optimizer (by convention, in case of non-uniqueness select the minimum of optimizers)
 def find_min(decomp, epsilon, X, P0, m_ss, a, b):
-    q_min = np.Inf
-    min_Choq = np.Inf
+    q_min = np.inf
+    min_Choq = np.inf
     for (q_l, q_u, i_s, j_s) in decomp:
         Choq_u = upper_lambda(q_u, epsilon, i_s, j_s, X, P0, m_ss, a, b)
         if Choq_u <= min_Choq:
@@ -199,4 +208,37 @@ def find_min(decomp, epsilon, X, P0, m_ss, a, b):
 
 
 
-        
\ No newline at end of file
+        
+###############################################################################
+# GENERIC CHOQUET EXPECTATION
+###############################################################################
+
+# Convert a Mobius inverse (nu* or nu**) into masses of the intervals of indices
+# {0, ..., k} (m_prefix[k]) and {k, ..., n-1} (m_suffix[k])
+def interval_masses(m, n):
+    m_prefix = np.zeros(n)
+    m_suffix = np.zeros(n)
+    for (A, m_A) in m:
+        i, j = min(A), max(A)
+        if len(A) != j - i + 1 or (i != 0 and j != n - 1):
+            raise ValueError('focal set ' + str(A) + ' is not an interval of indices containing 0 or n - 1')
+        if i == 0:
+            m_prefix[j] += m_A
+        else:
+            m_suffix[i] += m_A
+    return (m_prefix, m_suffix)
+
+# Compute the epsilon-contaminated Choquet expectation of the payoffs F over X
+# (a vector of length n or a batch of shape (..., n), referred to the decreasing order of X):
+#   (1 - epsilon) * E_P0[F] + epsilon * sum_A m(A) * min_A F   (lower=True)
+#   (1 - epsilon) * E_P0[F] + epsilon * sum_A m(A) * max_A F   (lower=False)
+# Since focal sets are nested intervals, min_A F and max_A F are running extrema along X
+#   * lower=True with nu* gives the lower expectation used in lower_pi
+#   * lower=False with nu** gives the upper expectation used in C_Lambda
+def choquet(F, epsilon, P0, masses, lower=True):
+    F = np.asarray(F, dtype=float)
+    m_prefix, m_suffix = masses
+    ext = np.minimum if lower else np.maximum
+    ext_prefix = ext.accumulate(F, axis=-1)
+    ext_suffix = ext.accumulate(F[..., ::-1], axis=-1)[..., ::-1]
+    return (1 - epsilon) * F.dot(P0) + epsilon * (ext_prefix.dot(m_prefix) + ext_suffix.dot(m_suffix))
@@ -89,7 +89,6 @@ plt.ylabel(r"${\bb C}_{\nu^*_\epsilon}[\Pi(q)]$")
 optimizers = []
 
 for epsilon in epsilons:
-    i_max = -np.infty
     qs = np.append(np.append([X[0] + 100], X), [0])
     
     lower_pi = []
@@ -97,12 +96,8 @@ for epsilon in epsilons:
         lower_pi.append(env.lower_pi(q, epsilon, X, P0, alpha, r, c))
     plt.plot(qs, lower_pi, color=colors[i_color], label="$\epsilon=$" + str(round(epsilon,4)))
     
-    lower_pi_max = max(lower_pi)
-    
-    # Selects the minimum of optimizers (which has maximum index since values of X are decreasing)
-    i_max = np.max(np.argwhere(np.abs(lower_pi - lower_pi_max) <= 0.000001))
-    
-    optimizers.append((qs[i_max],lower_pi_max))
+    # Selects the minimum of optimizers
+    optimizers.append(env.find_max(epsilon, X, P0, alpha, r, c))
     
     i_color +=1
     
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optimization code for the paper:
+
+A. Cinfrignini, D. Petturiti, G. Stabile (2024).
+Newsvendor problem with discrete demand and constrained first moment under ambiguity.
+
+INPUT:
+   * problem: 'minmax' (costs are pairs (a, b)) or 'maxmin' (costs are pairs (r, c))
+   * distributions: list of pairs (X, P0) with X in decreasing order
+   * epsilons: contamination levels in [0, 1]
+   * costs: list of cost pairs
+
+USAGE: Sharded sweep of the optimizer q* over the grid (distribution x epsilon x cost).
+The study is split into shard files in a shared directory, which may be
+processed by independent worker processes, possibly on different hosts:
+
+    python sweep.py plan DIR              # write the shards of the study below
+    python sweep.py work DIR              # run a worker (start as many as needed)
+    python sweep.py merge DIR             # assemble DIR/grid.npz
+    python sweep.py local DIR -w 4        # plan, run 4 local workers and merge
+
+Layout of DIR:
+   * plan.json: the parameter study, with a unique id stored in every result
+   * pending/: shards waiting for a worker
+   * claimed/: shards being processed, named <shard>@<worker>
+   * results/: partial results, one file per shard
+   * failed/: shards whose solver raised, with the traceback in <shard>.err
+
+A worker claims a shard with an atomic rename from pending/ to claimed/ and
+touches the claimed file after every point as a heartbeat. Claimed shards
+whose heartbeat is older than the timeout are renamed back to pending/, so
+shards of dead workers are processed again. A shard whose solver raises is
+moved to failed/ instead, so that it does not crash every worker in turn;
+merge refuses to run until the failed shards are fixed and moved back to pending/.
+
+IMPORTANT: The shared directory must support atomic renames (any local or
+NFS file system) and the timeout must exceed the clock skew between hosts.
+
+IMPORTANT: If the optimizer is not unique we select the minimum optimizer by convention
+"""
+
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+import uuid
+import numpy as np
+import epsilon_newsvendor as env
+
+
+###############################################################################
+################################ PARAMETERS ###################################
+###############################################################################
+
+# Uniform distribution over {100, ..., 0}
+X = np.arange(100,-1,-1)
+P0 = np.ones(len(X)) / len(X)
+
+problem = 'minmax'
+distributions = [(X, P0)]
+epsilons = np.arange(0, 1.2, 0.2)
+step = 0.5
+costs = [(a, b) for a in np.arange(0.5, 5 + step, step) for b in np.arange(0.5, 5 + step, step)]
+
+# Number of grid points per shard
+shard_size = 50
+
+# Seconds without heartbeat after which a claimed shard is reclaimed
+timeout = 600
+
+###############################################################################
+###############################################################################
+###############################################################################
+
+
+###############################################################################
+# PLAN
+###############################################################################
+
+# Split the parameter study into shard files in the directory, which must be empty or missing
+def make_plan(directory, problem, distributions, epsilons, costs, shard_size):
+    if os.path.isdir(directory) and len(os.listdir(directory)) > 0:
+        raise FileExistsError('directory ' + directory + ' is not empty, use a new one for each study')
+    for sub in ('pending', 'claimed', 'results', 'failed'):
+        os.makedirs(os.path.join(directory, sub))
+
+    plan = {
+        'id': uuid.uuid4().hex,
+        'problem': problem,
+        'distributions': [([float(x) for x in X], [float(p) for p in P0]) for (X, P0) in distributions],
+        'epsilons': [float(epsilon) for epsilon in epsilons],
+        'costs': [(float(u), float(v)) for (u, v) in costs],
+    }
+    points = list(itertools.product(range(len(distributions)), range(len(epsilons)), range(len(costs))))
+    shards = [points[k:k + shard_size] for k in range(0, len(points), shard_size)]
+    plan['shards'] = len(shards)
+
+    # Shards are written before the plan, so that workers never see a partial study
+    for (k, shard) in enumerate(shards):
+        write_json(os.path.join(directory, 'pending', shard_name(k)), shard)
+    write_json(os.path.join(directory, 'plan.json'), plan)
+    return plan
+
+# Name of the k-th shard file
+def shard_name(k):
+    return 'shard_%06d.json' % k
+
+# Write a JSON file atomically (write to a temporary file, then rename)
+def write_json(path, obj):
+    tmp = path + '.tmp.' + worker_id()
+    with open(tmp, 'w') as fp:
+        json.dump(obj, fp)
+    os.replace(tmp, path)
+
+def read_json(path):
+    with open(path) as fp:
+        return json.load(fp)
+
+# Identifier of the current worker process, unique across hosts
+def worker_id():
+    return socket.gethostname() + '-' + str(os.getpid())
+
+
+###############################################################################
+# WORK QUEUE
+###############################################################################
+
+# Move back to pending/ the claimed shards whose heartbeat is older than timeout
+def reclaim_stale(directory, timeout):
+    now = time.time()
+    reclaimed = 0
+    for name in os.listdir(os.path.join(directory, 'claimed')):
+        path = os.path.join(directory, 'claimed', name)
+        try:
+            if now - os.stat(path).st_mtime <= timeout:
+                continue
+            os.rename(path, os.path.join(directory, 'pending', name.split('@')[0]))
+            reclaimed += 1
+        except FileNotFoundError:
+            # Finished or reclaimed by another worker in the meantime
+            pass
+    return reclaimed
+
+# Claim a pending shard, returns (shard, claimed path) or None if nothing is pending
+def claim_shard(directory):
+    for name in sorted(os.listdir(os.path.join(directory, 'pending'))):
+        path = os.path.join(directory, 'pending', name)
+        claimed = os.path.join(directory, 'claimed', name + '@' + worker_id())
+        try:
+            # Refresh the heartbeat before the rename, which preserves it
+            os.utime(path)
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            # Claimed by another worker
+            continue
+        if os.path.exists(os.path.join(directory, 'results', name)):
+            # Result already written by a worker whose claim had been reclaimed
+            release_shard(claimed)
+            continue
+        return (name, claimed)
+    return None
+
+# Refresh the heartbeat of a claimed shard, returns False if the claim was lost
+def heartbeat(claimed):
+    try:
+        os.utime(claimed)
+        return True
+    except FileNotFoundError:
+        return False
+
+def release_shard(claimed):
+    try:
+        os.remove(claimed)
+    except FileNotFoundError:
+        pass
+
+
+###############################################################################
+# SOLVER
+###############################################################################
+
+# Compute the optimizer q* and the optimal value on a grid point
+def solve_point(problem, X, P0, epsilon, cost, m_ss=None, alpha=None):
+    (u, v) = cost
+    if problem == 'minmax':
+        decomp = env.decomposition(X, u, v)
+        return env.find_min(decomp, epsilon, X, P0, m_ss, u, v)
+    else:
+        return env.find_max(epsilon, X, P0, alpha, u, v)
+
+# Process all points of a shard, returns None if the claim was lost
+def solve_shard(plan, shard, claimed):
+    problem = plan['problem']
+    mobius = {}
+    result = []
+    for (d, e, k) in shard:
+        if d not in mobius:
+            X = np.array(plan['distributions'][d][0])
+            P0 = np.array(plan['distributions'][d][1])
+            if problem == 'minmax':
+                m_ss, alpha, _ = env.mobius_nu_ss(X, P0)
+            else:
+                _, alpha, _ = env.mobius_nu_s(X, P0)
+                m_ss = None
+            mobius[d] = (X, P0, m_ss, alpha)
+        (X, P0, m_ss, alpha) = mobius[d]
+        (q_opt, value) = solve_point(problem, X, P0, plan['epsilons'][e], plan['costs'][k], m_ss, alpha)
+        result.append((d, e, k, float(q_opt), float(value)))
+        if not heartbeat(claimed):
+            return None
+    return result
+
+# Number of shards in a subdirectory (temporary and traceback files are not counted)
+def count_shards(directory, sub):
+    return len([name for name in os.listdir(os.path.join(directory, sub)) if name.endswith('.json')])
+
+# Move a claimed shard whose solver raised to failed/, with its traceback
+def fail_shard(directory, name, claimed):
+    with open(os.path.join(directory, 'failed', name + '.err'), 'w') as fp:
+        fp.write(traceback.format_exc())
+    try:
+        os.rename(claimed, os.path.join(directory, 'failed', name))
+    except FileNotFoundError:
+        # Reclaimed by another worker in the meantime
+        pass
+
+# Process shards until the whole study is done
+def run_worker(directory, timeout, poll=1.0):
+    plan = read_json(os.path.join(directory, 'plan.json'))
+    processed = 0
+    while count_shards(directory, 'results') + count_shards(directory, 'failed') < plan['shards']:
+        claim = claim_shard(directory)
+        if claim is None:
+            # Other workers are busy on the remaining shards: wait for them or their timeout
+            if reclaim_stale(directory, timeout) == 0:
+                time.sleep(poll)
+            continue
+        (name, claimed) = claim
+        try:
+            result = solve_shard(plan, read_json(claimed), claimed)
+        except Exception:
+            fail_shard(directory, name, claimed)
+            continue
+        if result is not None:
+            write_json(os.path.join(directory, 'results', name), {'plan': plan['id'], 'points': result})
+            processed += 1
+        release_shard(claimed)
+    return processed
+
+
+###############################################################################
+# MERGE
+###############################################################################
+
+# Assemble the grids of optimizers and optimal values indexed by (distribution, epsilon, cost)
+def merge(directory):
+    plan = read_json(os.path.join(directory, 'plan.json'))
+    shape = (len(plan['distributions']), len(plan['epsilons']), len(plan['costs']))
+    q_opt = np.full(shape, np.nan)
+    value = np.full(shape, np.nan)
+
+    failed = count_shards(directory, 'failed')
+    if failed > 0:
+        raise RuntimeError('%d of %d shards failed, see %s' % (failed, plan['shards'], os.path.join(directory, 'failed')))
+
+    missing = [k for k in range(plan['shards']) if not os.path.exists(os.path.join(directory, 'results', shard_name(k)))]
+    if len(missing) > 0:
+        raise RuntimeError('%d of %d shards have no result yet' % (len(missing), plan['shards']))
+
+    for k in range(plan['shards']):
+        result = read_json(os.path.join(directory, 'results', shard_name(k)))
+        if result['plan'] != plan['id']:
+            raise RuntimeError('result of ' + shard_name(k) + ' belongs to another plan')
+        for (d, e, c, q, v) in result['points']:
+            q_opt[d, e, c] = q
+            value[d, e, c] = v
+
+    np.savez(os.path.join(directory, 'grid.npz'), q_opt=q_opt, value=value,
+             epsilons=np.array(plan['epsilons']), costs=np.array(plan['costs']))
+    return (q_opt, value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sharded sweep of the optimizer q*')
+    parser.add_argument('command', choices=['plan', 'work', 'merge', 'local'])
+    parser.add_argument('directory')
+    parser.add_argument('-w', '--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='number of local worker processes (local only)')
+    parser.add_argument('-t', '--timeout', type=float, default=timeout,
+                        help='seconds after which a silent claimed shard is reclaimed')
+    args = parser.parse_args()
+
+    if args.command in ('plan', 'local'):
+        plan = make_plan(args.directory, problem, distributions, epsilons, costs, shard_size)
+        print('Written', plan['shards'], 'shards to', args.directory)
+
+    if args.command == 'work':
+        print('Processed', run_worker(args.directory, args.timeout), 'shards')
+
+    if args.command == 'local':
+        workers = [multiprocessing.Process(target=run_worker, args=(args.directory, args.timeout))
+                   for _ in range(args.workers)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        crashed = [w.exitcode for w in workers if w.exitcode != 0]
+        if len(crashed) > 0:
+            raise SystemExit('%d of %d workers exited with codes %s' % (len(crashed), len(workers), crashed))
+
+    if args.command in ('merge', 'local'):
+        (q_opt, value) = merge(args.directory)
+        print('Merged grid of shape', q_opt.shape, 'into', os.path.join(args.directory, 'grid.npz'))